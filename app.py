@@ -1,15 +1,19 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+import csv
+import hashlib
 import io
 import os
-import tempfile
+import queue
+import threading
+import time
 import zipfile
-import calendar
-import locale
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime, timedelta
+from string import Template
 from data_processor import process_data
-from pdf_generator import generate_pdf
+from pdf_generator import generate_pdf_fast
 from utils import format_currency, to_float, calculate_period_dates
 
 # Set page configuration
@@ -20,117 +24,226 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Tentativo di impostare la lingua italiana per i mesi
-try:
-    locale.setlocale(locale.LC_TIME, 'it_IT.UTF-8')
-except:
-    try:
-        locale.setlocale(locale.LC_TIME, 'it_IT')
-    except:
-        pass  # Fallback alla lingua di sistema
+# Nomi dei mesi in italiano, indicizzati da month-1
+ITALIAN_MONTHS = (
+    "Gennaio", "Febbraio", "Marzo", "Aprile", "Maggio", "Giugno",
+    "Luglio", "Agosto", "Settembre", "Ottobre", "Novembre", "Dicembre"
+)
 
 # Funzioni di supporto
+@st.cache_data(show_spinner=False)
+def _load_payroll(name, data):
+    """Legge il file paghe caricato (xlsx/xls/csv) in un DataFrame.
+
+    Il risultato è messo in cache sul contenuto del file, così i rerun di
+    Streamlit (ogni click su un widget) non rifanno il parsing da zero.
+    """
+    if name.endswith(('.xlsx', '.xls')):
+        # Calamine (parser Rust) è 10-50x più veloce di openpyxl sui fogli
+        # grandi; openpyxl resta come fallback se non è installato
+        try:
+            return pd.read_excel(io.BytesIO(data), engine='calamine')
+        except (ImportError, ValueError):
+            return pd.read_excel(io.BytesIO(data))
+    # Individua il separatore una volta sola dai primi 8 KB, poi delega al
+    # parser C (o PyArrow se disponibile) invece del lento engine='python'
+    head = data[:8192].decode('utf-8', errors='replace')
+    try:
+        sep = csv.Sniffer().sniff(head).delimiter
+    except csv.Error:
+        sep = ';'
+    try:
+        return pd.read_csv(io.BytesIO(data), sep=sep, engine='pyarrow')
+    except (ImportError, ValueError):
+        return pd.read_csv(io.BytesIO(data), sep=sep, engine='c')
+
+
+@st.cache_data(show_spinner=False)
+def _process_data_cached(payroll_data, manual_date_info):
+    """Wrapper cache di process_data: evita di rielaborare i dati a ogni rerun."""
+    return process_data(payroll_data, manual_date_info)
+
+
+def _render_pdf(cols, date_info):
+    """Renderizza in memoria il PDF di un operatore e ne restituisce i byte.
+
+    Riceve un dict colonna -> ndarray: più leggero di un DataFrame sia da
+    picklare verso il worker che da iterare riga per riga nel generatore.
+    """
+    buf = io.BytesIO()
+    generate_pdf_fast(cols, buf, date_info)
+    return buf.getvalue()
+
+
+def _run_batch(grouped, date_info, pdf_folder, q):
+    """Genera il batch di PDF e lo zip fuori dal thread principale di Streamlit.
+
+    I messaggi di avanzamento vengono messi su `q`; l'ultimo messaggio
+    contiene i byte dello zip completo (o l'errore del worker).
+    """
+    try:
+        zip_buffer = io.BytesIO()
+        # ZIP_STORED esplicito: i PDF sono già compressi (stream Flate),
+        # ricomprimerli costerebbe CPU per un guadagno ~nullo
+        with zipfile.ZipFile(zip_buffer, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as zip_file:
+            # Genera i PDF in parallelo: ogni operatore è indipendente e
+            # il rendering è CPU-bound, quindi un processo per core.
+            with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+                futures = {}
+                for employee, employee_data in grouped.items():
+                    cols = {c: employee_data[c].to_numpy() for c in employee_data.columns}
+                    futures[executor.submit(_render_pdf, cols, date_info)] = employee
+
+                for i, future in enumerate(as_completed(futures)):
+                    employee = futures[future]
+                    pdf_bytes = future.result()  # Propaga eventuali errori del worker
+
+                    # Naming convention from the macro
+                    employee_name = str(employee).replace(' ', '_')
+                    zip_file.writestr(f"{pdf_folder}/Report_{employee_name}.pdf", pdf_bytes)
+                    q.put({'pct': (i + 1) / len(futures), 'employee': str(employee)})
+
+        q.put({'done': True, 'zip': zip_buffer.getvalue()})
+    except Exception as e:
+        q.put({'error': str(e)})
+
+
 def get_italian_month_name(month_num):
     """Ottiene il nome del mese in italiano"""
-    italian_months = {
-        1: "Gennaio", 2: "Febbraio", 3: "Marzo", 4: "Aprile",
-        5: "Maggio", 6: "Giugno", 7: "Luglio", 8: "Agosto",
-        9: "Settembre", 10: "Ottobre", 11: "Novembre", 12: "Dicembre"
-    }
-    return italian_months.get(month_num, calendar.month_name[month_num])
+    return ITALIAN_MONTHS[month_num - 1]
+
+def _fmt_dmy(d):
+    """Formatta una data come gg/mm/aaaa (formattazione intera, niente strftime)"""
+    return f"{d.day:02d}/{d.month:02d}/{d.year}"
+
+# Giorni per mese (anno non bisestile), indicizzati da month-1
+_DAYS_IN_MONTH = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+def _mdays(year, month):
+    """Numero di giorni del mese, tenendo conto degli anni bisestili"""
+    if month == 2 and (year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)):
+        return 29
+    return _DAYS_IN_MONTH[month - 1]
 
 # Colori e stile
 primary_color = "#007AFF"  # Apple blue
 secondary_color = "#F5F5F7"  # Apple light grey
 dark_grey = "#333333"  # Apple dark grey
 
-# Customizzazione CSS in stile Apple
-st.markdown(f"""
+# Blocchi HTML statici costruiti una sola volta a import time: i colori sono
+# costanti, quindi i rerun non devono reinterpolare le stesse stringhe
+
+# Customizzazione CSS in stile Apple. Il template viene sostituito una sola
+# volta a import time: i rerun passano a st.markdown sempre la stessa stringa
+_CSS_TMPL = Template("""
     <style>
-    .main .block-container {{
+    .main .block-container {
         max-width: 1200px;
         padding: 2rem;
         background-color: white;
         border-radius: 10px;
         box-shadow: 0 1px 3px rgba(0,0,0,0.1);
-    }}
-    h1, h2, h3, h4 {{
+    }
+    h1, h2, h3, h4 {
         font-family: 'SF Pro Display', 'Helvetica Neue', sans-serif;
-        color: {dark_grey};
-    }}
-    .stButton>button {{
-        background-color: {primary_color};
+        color: $dark;
+    }
+    .stButton>button {
+        background-color: $primary;
         color: white;
         font-weight: 500;
         border: none;
         border-radius: 5px;
         padding: 0.5rem 1rem;
         transition: all 0.2s;
-    }}
-    .stButton>button:hover {{
+    }
+    .stButton>button:hover {
         background-color: #0062cc;
         box-shadow: 0 2px 5px rgba(0,0,0,0.1);
-    }}
-    .stDownloadButton>button {{
-        background-color: {primary_color};
+    }
+    .stDownloadButton>button {
+        background-color: $primary;
         color: white;
         font-weight: 500;
         border: none;
         border-radius: 5px;
         padding: 0.5rem 1rem;
         transition: all 0.2s;
-    }}
-    .stDownloadButton>button:hover {{
+    }
+    .stDownloadButton>button:hover {
         background-color: #0062cc;
         box-shadow: 0 2px 5px rgba(0,0,0,0.1);
-    }}
-    .stUploadButton>button {{
-        border-color: {primary_color};
-        color: {primary_color};
-    }}
-    .stProgress .st-bo {{
-        background-color: {primary_color};
-    }}
-    .sidebar .sidebar-content {{
-        background-color: {secondary_color};
-    }}
+    }
+    .stUploadButton>button {
+        border-color: $primary;
+        color: $primary;
+    }
+    .stProgress .st-bo {
+        background-color: $primary;
+    }
+    .sidebar .sidebar-content {
+        background-color: $secondary;
+    }
     </style>
-""", unsafe_allow_html=True)
+""")
+_CSS = _CSS_TMPL.substitute(primary=primary_color, secondary=secondary_color, dark=dark_grey)
 
 # App title
-st.markdown(f"""
+_TITLE_HTML = """
     <h1 style='text-align: center; margin-bottom: 1.5rem;'>
         Generatore Fogli Paga
     </h1>
-""", unsafe_allow_html=True)
+"""
 
-# Sidebar with instructions
-with st.sidebar:
-    st.markdown(f"""
+_SIDEBAR_HEADER_HTML = f"""
     <h3 style='color: {primary_color};'>Istruzioni</h3>
-    """, unsafe_allow_html=True)
-    
-    st.markdown("""
-    1. Seleziona il mese e l'anno di elaborazione
-    2. Carica il file con i dati di paga (equivalente a 'incolla qui')
-    3. Genera e scarica i PDF delle buste paga
-    """)
-    
-    st.markdown(f"""
+"""
+
+_SIDEBAR_INFO_HTML = f"""
     <div style="margin-top: 2rem; padding: 1rem; background-color: rgba(0, 122, 255, 0.05); border-radius: 5px; border-left: 3px solid {primary_color};">
         <h3 style='color: {primary_color}; margin-top: 0;'>Informazioni sui File</h3>
         <p style="font-size: 0.9rem;">
             <strong>File Dati Paga:</strong> Carica il tracciato di CL scaricabile dal campo (05>07>11). Questo file contiene i dati dei dipendenti e delle aziende.
         </p>
     </div>
-    """, unsafe_allow_html=True)
+"""
 
-# Main content in card layout
-st.markdown(f"""
+_PERIOD_CARD_HTML = f"""
     <div style="padding: 1.5rem; background-color: white; border-radius: 10px; margin-bottom: 1.5rem; box-shadow: 0 1px 2px rgba(0,0,0,0.05);">
         <h2 style="margin-top: 0; color: {primary_color};">Selezione Periodo</h2>
     </div>
-""", unsafe_allow_html=True)
+"""
+
+_UPLOAD_CARD_HTML = f"""
+    <div style="padding: 1.5rem; background-color: white; border-radius: 10px; margin: 1.5rem 0; box-shadow: 0 1px 2px rgba(0,0,0,0.05);">
+        <h2 style="margin-top: 0; color: {primary_color};">Caricamento File</h2>
+    </div>
+"""
+
+_UPLOAD_HINT_HTML = """
+    <div style="background-color: rgba(0, 122, 255, 0.05); padding: 1rem; border-radius: 5px; margin-bottom: 0.5rem;">
+        <p style="margin: 0; font-size: 0.9rem;">File dati paga (tracciato di CL scaricabile dal campo 05>07>11)</p>
+    </div>
+"""
+
+st.markdown(_CSS, unsafe_allow_html=True)
+
+st.markdown(_TITLE_HTML, unsafe_allow_html=True)
+
+# Sidebar with instructions
+with st.sidebar:
+    st.markdown(_SIDEBAR_HEADER_HTML, unsafe_allow_html=True)
+
+    st.markdown("""
+    1. Seleziona il mese e l'anno di elaborazione
+    2. Carica il file con i dati di paga (equivalente a 'incolla qui')
+    3. Genera e scarica i PDF delle buste paga
+    """)
+
+    st.markdown(_SIDEBAR_INFO_HTML, unsafe_allow_html=True)
+
+# Main content in card layout
+st.markdown(_PERIOD_CARD_HTML, unsafe_allow_html=True)
 
 col1, col2 = st.columns(2)
 with col1:
@@ -139,50 +252,67 @@ with col1:
     selected_year = st.selectbox("Anno", year_options, index=5)  # Default: anno corrente
 
 with col2:
-    italian_month_names = [get_italian_month_name(i) for i in range(1, 13)]
     current_month = datetime.now().month - 1  # -1 perché gli indici partono da 0
-    selected_month = st.selectbox("Mese", italian_month_names, index=current_month)
-    selected_month_idx = italian_month_names.index(selected_month) + 1  # +1 perché i mesi iniziano da 1
+    # Il selectbox lavora direttamente sui numeri di mese: niente .index()
+    # sulla lista dei nomi a ogni rerun
+    selected_month_idx = st.selectbox("Mese", list(range(1, 13)), index=current_month,
+                                      format_func=get_italian_month_name)
+    selected_month = get_italian_month_name(selected_month_idx)
 
 # Calcola le date di inizio e fine del mese selezionato
 start_date = datetime(selected_year, selected_month_idx, 1)
-end_date = datetime(selected_year, selected_month_idx, calendar.monthrange(selected_year, selected_month_idx)[1])
+end_date = datetime(selected_year, selected_month_idx, _mdays(selected_year, selected_month_idx))
 
 # File upload section
-st.markdown(f"""
-    <div style="padding: 1.5rem; background-color: white; border-radius: 10px; margin: 1.5rem 0; box-shadow: 0 1px 2px rgba(0,0,0,0.05);">
-        <h2 style="margin-top: 0; color: {primary_color};">Caricamento File</h2>
-    </div>
-""", unsafe_allow_html=True)
+st.markdown(_UPLOAD_CARD_HTML, unsafe_allow_html=True)
 
-st.markdown(f"""
-    <div style="background-color: rgba(0, 122, 255, 0.05); padding: 1rem; border-radius: 5px; margin-bottom: 0.5rem;">
-        <p style="margin: 0; font-size: 0.9rem;">File dati paga (tracciato di CL scaricabile dal campo 05>07>11)</p>
-    </div>
-""", unsafe_allow_html=True)
+st.markdown(_UPLOAD_HINT_HTML, unsafe_allow_html=True)
 payroll_file = st.file_uploader("Seleziona file", type=["xlsx", "xls", "csv"], key="payroll", label_visibility="collapsed")
 
 # Process file when uploaded
 if payroll_file:
     try:
-        # Read payroll file
-        if payroll_file.name.endswith(('.xlsx', '.xls')):
-            payroll_data = pd.read_excel(payroll_file)
-        elif payroll_file.name.endswith('.csv'):
-            payroll_data = pd.read_csv(payroll_file, sep=None, engine='python')
-        
-        # Create date_info dict based on selected period
-        manual_date_info = {
-            "period": f"{selected_month} {selected_year}",
-            "italian_month": selected_month.lower(),  # Nome mese in italiano per il nome della cartella
-            "start_date": start_date.strftime("%d/%m/%Y"),
-            "end_date": end_date.strftime("%d/%m/%Y"),
-            "min_date": start_date,
-            "max_date": end_date
-        }
-        
-        # Process data with selected period info
-        processed_data, date_info = process_data(payroll_data, manual_date_info)
+        # Chiave di sessione su contenuto del file + periodo: i rerun (es. il
+        # click su "Genera PDF") riusano il frame già elaborato senza nemmeno
+        # passare dalla cache, finché file e periodo non cambiano
+        file_hash = hashlib.blake2b(payroll_file.getvalue(), digest_size=16).hexdigest()
+        processed_key = f"{file_hash}:{selected_year}-{selected_month_idx:02d}"
+
+        if st.session_state.get('processed_key') != processed_key:
+            # Read payroll file (cached: i rerun riusano il DataFrame già letto)
+            payroll_data = _load_payroll(payroll_file.name, payroll_file.getvalue())
+
+            # Create date_info dict based on selected period
+            manual_date_info = {
+                "period": f"{selected_month} {selected_year}",
+                "italian_month": selected_month.lower(),  # Nome mese in italiano per il nome della cartella
+                "start_date": _fmt_dmy(start_date),
+                "end_date": _fmt_dmy(end_date),
+                "min_date": start_date,
+                "max_date": end_date
+            }
+
+            # Process data with selected period info (cached sul contenuto del file
+            # e sul periodo: cliccare "Genera PDF" non rielabora i dati)
+            processed_data, date_info = _process_data_cached(payroll_data, manual_date_info)
+
+            if processed_data is not None and 'Operatore' in processed_data.columns:
+                # Colonna a bassa cardinalità ripetuta su molte righe: come category
+                # il groupby lavora su codici interi invece che su stringhe Python
+                processed_data['Operatore'] = processed_data['Operatore'].astype('category')
+
+            st.session_state['processed'] = processed_data
+            st.session_state['date_info'] = date_info
+            st.session_state['processed_key'] = processed_key
+
+            # File o periodo cambiati: invalida l'eventuale download della
+            # generazione precedente, altrimenti la card offrirebbe lo zip
+            # del periodo sbagliato
+            for stale_key in ('result_bytes', 'result_name', 'result_mime'):
+                st.session_state.pop(stale_key, None)
+
+        processed_data = st.session_state['processed']
+        date_info = st.session_state['date_info']
         
         if processed_data is not None and not processed_data.empty:
             st.markdown(f"""
@@ -215,82 +345,120 @@ if payroll_file:
                 generate_button = st.button("Genera PDF", use_container_width=True)
                 
             if generate_button:
-                # Create a temporary directory to store the PDFs
-                with tempfile.TemporaryDirectory() as temp_dir:
-                    # Create a subfolder similar to the VBA macro: "Fogli paghe_<mese>"
-                    pdf_folder = os.path.join(temp_dir, f"Fogli_paghe_{date_info['italian_month']}")
-                    os.makedirs(pdf_folder, exist_ok=True)
-                    
-                    # Group by employee
-                    employees = processed_data['Operatore'].unique()
-                    
+                # Cartella logica dentro lo zip, come nella macro VBA: "Fogli paghe_<mese>"
+                pdf_folder = f"Fogli_paghe_{date_info['italian_month']}"
+
+                # Ordina una volta per operatore: le righe di ogni operatore
+                # diventano un blocco contiguo e ogni slice è una vista
+                # start:end a costo zero, senza maschere booleane né hashing
+                batch_data = processed_data.sort_values('Operatore', kind='stable', ignore_index=True)
+                codes, uniques = pd.factorize(batch_data['Operatore'], sort=False)
+                offsets = np.concatenate([[0], np.flatnonzero(np.diff(codes)) + 1, [len(codes)]])
+                grouped = {uniques[i]: batch_data.iloc[offsets[i]:offsets[i + 1]]
+                           for i in range(len(uniques))}
+                employees = list(grouped)
+
+                if len(employees) == 1:
+                    # Un solo operatore: servi direttamente il PDF, lo zip
+                    # aggiungerebbe solo il passaggio CRC e una copia in più
+                    employee = employees[0]
+                    employee_data = grouped[employee]
+                    cols = {c: employee_data[c].to_numpy() for c in employee_data.columns}
+                    pdf_bytes = _render_pdf(cols, date_info)
+
+                    employee_name = str(employee).replace(' ', '_')
+                    st.session_state['result_bytes'] = pdf_bytes
+                    st.session_state['result_name'] = f"Report_{employee_name}.pdf"
+                    st.session_state['result_mime'] = "application/pdf"
+                else:
                     # Progress bar with card styling
                     st.markdown(f"""
                         <div style="padding: 1.5rem; background-color: white; border-radius: 10px; box-shadow: 0 1px 2px rgba(0,0,0,0.05); margin-top: 1.5rem;">
                             <h3 style="margin-top: 0; color: {primary_color};">Progresso Generazione</h3>
                     """, unsafe_allow_html=True)
-                    
+
                     progress_bar = st.progress(0)
                     status_text = st.empty()
-                    
-                    # Generate PDF for each employee
-                    pdf_files = []
-                    for i, employee in enumerate(employees):
-                        status_text.markdown(f"""
-                            <div style="padding: 0.5rem; border-radius: 5px; margin-bottom: 0.5rem; text-align: center;">
-                                <p style="margin: 0;"><strong>Generazione PDF per</strong>: {employee}...</p>
-                            </div>
-                        """, unsafe_allow_html=True)
-                        
-                        # Filter data for this employee
-                        employee_data = processed_data[processed_data['Operatore'] == employee]
-                        
-                        # Generate PDF with naming convention from the macro
-                        employee_name = str(employee).replace(' ', '_')
-                        pdf_path = os.path.join(pdf_folder, f"Report_{employee_name}.pdf")
-                        generate_pdf(employee_data, pdf_path, date_info)
-                        pdf_files.append(pdf_path)
-                        
-                        # Update progress
-                        progress_bar.progress((i + 1) / len(employees))
-                    
+
+                    # Lancia il batch in un thread separato: il rendering non blocca
+                    # il websocket di Streamlit e gli aggiornamenti di progresso
+                    # arrivano via coda mentre il pool di processi lavora
+                    q = queue.Queue()
+                    worker = threading.Thread(
+                        target=_run_batch,
+                        args=(grouped, date_info, pdf_folder, q),
+                        daemon=True
+                    )
+                    worker.start()
+
+                    # Aggiorna la UI al massimo ogni ~100 ms: ogni update è un
+                    # roundtrip websocket e con centinaia di operatori
+                    # dominerebbe il tempo totale
+                    last_update = time.monotonic()
+                    zip_bytes = None
+                    while True:
+                        try:
+                            msg = q.get(timeout=0.1)
+                        except queue.Empty:
+                            if not worker.is_alive():
+                                break
+                            continue
+
+                        if 'error' in msg:
+                            raise RuntimeError(msg['error'])
+                        if msg.get('done'):
+                            zip_bytes = msg['zip']
+                            break
+
+                        now = time.monotonic()
+                        if now - last_update > 0.1 or msg['pct'] >= 1.0:
+                            last_update = now
+                            status_text.markdown(f"""
+                                <div style="padding: 0.5rem; border-radius: 5px; margin-bottom: 0.5rem; text-align: center;">
+                                    <p style="margin: 0;"><strong>PDF generato per</strong>: {msg['employee']}</p>
+                                </div>
+                            """, unsafe_allow_html=True)
+
+                            # Update progress
+                            progress_bar.progress(msg['pct'])
+
                     status_text.markdown(f"""
                         <div style="padding: 0.75rem; background-color: #f0fff0; border-left: 4px solid #00aa00; border-radius: 4px; margin: 1rem 0; text-align: center;">
                             <h3 style="margin: 0; color: #00aa00;">✓ Generazione PDF completata!</h3>
                         </div>
                     """, unsafe_allow_html=True)
-                    
+
                     st.markdown("</div>", unsafe_allow_html=True)  # Chiude il div di progresso
-                    
-                    # Create zip file containing all PDFs with the folder structure
-                    zip_buffer = io.BytesIO()
-                    with zipfile.ZipFile(zip_buffer, 'w') as zip_file:
-                        for pdf_path in pdf_files:
-                            # Include folder structure in zip
-                            arc_name = os.path.join(os.path.basename(pdf_folder), os.path.basename(pdf_path))
-                            zip_file.write(pdf_path, arc_name)
-                    
-                    # Reset buffer position
-                    zip_buffer.seek(0)
-                    
-                    # Create download button using the naming convention from the macro
-                    st.markdown(f"""
-                        <div style="padding: 1.5rem; background-color: white; border-radius: 10px; box-shadow: 0 1px 2px rgba(0,0,0,0.05); margin-top: 1.5rem; text-align: center;">
-                            <h3 style="margin-top: 0; color: {primary_color};">Download</h3>
-                            <p>Tutti i PDF sono stati generati e compressi in un unico file ZIP.</p>
-                    """, unsafe_allow_html=True)
-                    
-                    col1, col2, col3 = st.columns([1, 2, 1])
-                    with col2:
-                        st.download_button(
-                            label="Scarica tutti i PDF",
-                            data=zip_buffer,
-                            file_name=f"Fogli_paghe_{date_info['italian_month']}.zip",
-                            mime="application/zip",
-                            use_container_width=True
-                        )
-                    
-                    st.markdown("</div>", unsafe_allow_html=True)
+
+                    # Conserva il risultato in sessione: un rerun (es. il click sul
+                    # bottone di download) non fa ripartire la generazione
+                    st.session_state['result_bytes'] = zip_bytes
+                    st.session_state['result_name'] = f"Fogli_paghe_{date_info['italian_month']}.zip"
+                    st.session_state['result_mime'] = "application/zip"
+
+            if st.session_state.get('result_bytes'):
+                is_zip = st.session_state['result_mime'] == "application/zip"
+                download_note = ("Tutti i PDF sono stati generati e compressi in un unico file ZIP."
+                                 if is_zip else "Il PDF è stato generato.")
+
+                # Create download button using the naming convention from the macro
+                st.markdown(f"""
+                    <div style="padding: 1.5rem; background-color: white; border-radius: 10px; box-shadow: 0 1px 2px rgba(0,0,0,0.05); margin-top: 1.5rem; text-align: center;">
+                        <h3 style="margin-top: 0; color: {primary_color};">Download</h3>
+                        <p>{download_note}</p>
+                """, unsafe_allow_html=True)
+
+                col1, col2, col3 = st.columns([1, 2, 1])
+                with col2:
+                    st.download_button(
+                        label="Scarica tutti i PDF" if is_zip else "Scarica PDF",
+                        data=st.session_state['result_bytes'],
+                        file_name=st.session_state['result_name'],
+                        mime=st.session_state['result_mime'],
+                        use_container_width=True
+                    )
+
+                st.markdown("</div>", unsafe_allow_html=True)
                     
     except Exception as e:
         st.error(f"Si è verificato un errore durante l'elaborazione: {str(e)}")
@@ -1,7 +1,14 @@
+import logging
+
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from utils import to_float, format_currency, calculate_period_dates
+from utils import to_float, to_float_array, format_currency_array, calculate_period_dates
+
+logger = logging.getLogger(__name__)
+
+# Giorni per mese (anno non bisestile), indicizzati da mese-1
+MONTH_DAYS = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31], dtype=np.int8)
 
 def process_data(payroll_data, manual_date_info=None):
     """
@@ -15,14 +22,15 @@ def process_data(payroll_data, manual_date_info=None):
         tuple: (processed_data, date_info)
     """
     try:
-        # Clean column names (remove leading/trailing spaces and special characters)
-        payroll_data.columns = payroll_data.columns.str.strip().str.replace('\n', ' ')
-        
-        # Print columns for debugging
-        print("Payroll data columns:", payroll_data.columns.tolist())
-        
-        # Make a copy to avoid modifying the original
-        df = payroll_data.copy()
+        # Clean column names (remove leading/trailing spaces and special
+        # characters). rename restituisce un nuovo frame che condivide i
+        # blocchi dati con l'input: niente copia profonda dell'intero file
+        df = payroll_data.rename(
+            columns={c: str(c).strip().replace('\n', ' ') for c in payroll_data.columns})
+
+        # Log columns for debugging (il tolist() gira solo se DEBUG è attivo)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Payroll data columns: %s", df.columns.tolist())
         
         # Use manually specified date information if provided
         if manual_date_info:
@@ -52,84 +60,78 @@ def process_data(payroll_data, manual_date_info=None):
         # Assumendo che le colonne sono nell'ordine specificato dal cliente
         # -- Colonne richieste: B=Operatore, C=Codice, D=Azienda, L+M=Dipendenti+StagE, N=Parasub, P=Soci, O=Altro
         
-        # Ottieni gli operatori dalla colonna B (indice 1)
+        # Individua la colonna degli operatori: colonna B (indice 1), oppure
+        # una colonna chiamata "Operatore" o simile, oppure la prima colonna.
+        # L'elenco univoco degli operatori non serve più: l'aggregazione
+        # avviene in un'unica groupby a valle
         operatori_col = 1  # Colonna B
-        if operatori_col < len(df.columns):
-            # Rimovi gli spazi in eccesso dai nomi degli operatori
-            df.iloc[:, operatori_col] = df.iloc[:, operatori_col].astype(str).str.strip()
-            operatori = df.iloc[:, operatori_col].dropna().unique()
+        if operatori_col >= len(df.columns):
+            operatori_col = next((i for i, col in enumerate(df.columns) if 'operatore' in col.lower()), 0)
+
+        # Rimovi gli spazi in eccesso dai nomi degli operatori. Serie locale:
+        # scriverla dentro df toccherebbe i blocchi condivisi con l'input
+        if len(df.columns) > 0:
+            op_series = df.iloc[:, operatori_col].astype(str).str.strip()
         else:
-            # Fallback: cerca una colonna chiamata "Operatore" o simile
-            operatori_col = next((i for i, col in enumerate(df.columns) if 'operatore' in col.lower()), None)
-            if operatori_col is not None:
-                df.iloc[:, operatori_col] = df.iloc[:, operatori_col].astype(str).str.strip()
-                operatori = df.iloc[:, operatori_col].dropna().unique()
-            else:
-                # Ultimo fallback: usa la prima colonna
-                df.iloc[:, 0] = df.iloc[:, 0].astype(str).str.strip()
-                operatori = df.iloc[:, 0].dropna().unique()
-        
-        # Initialize new dataframe structure to match the expected output format
-        processed_data = pd.DataFrame()
+            op_series = pd.Series("", index=df.index)
         
-        # Per ogni operatore, ottieni i dati delle aziende associate
-        rows = []
-        for operatore in operatori:
-            # Ottieni le righe per questo operatore
-            operatore_rows = df[df.iloc[:, operatori_col] == operatore]
-            
-            # Per ogni riga, estrai i dati corretti
-            for _, row in operatore_rows.iterrows():
-                # Estrai colonne specifiche come specificato dal cliente
-                try:
-                    codice = row.iloc[2] if len(row) > 2 else ""  # Colonna C
-                    azienda = row.iloc[3] if len(row) > 3 else ""  # Colonna D
-                    
-                    # L+M = Dipendenti + Stage/Interinali
-                    dipendenti = 0
-                    if len(row) > 11:  # Colonna L
-                        dipendenti += to_float(row.iloc[11])
-                    if len(row) > 12:  # Colonna M
-                        dipendenti += to_float(row.iloc[12])
-                    
-                    parasub = to_float(row.iloc[13]) if len(row) > 13 else 0  # Colonna N
-                    altro = to_float(row.iloc[15]) if len(row) > 15 else 0    # Colonna P = ALTRO
-                    soci = to_float(row.iloc[14]) if len(row) > 14 else 0     # Colonna O = SOCI
-                    
-                    # Calcola il totale come somma di dipendenti, parasub e altro (escludendo soci)
-                    totale = dipendenti + parasub + altro
-                    
-                    # Raccogli i dati in un dizionario
-                    rows.append({
-                        'Operatore': operatore,
-                        'Codice': codice,
-                        'Azienda': azienda,
-                        'DIP.': dipendenti,
-                        'PARAS.': parasub,
-                        'ALTRO': altro,
-                        'TOT.': totale,
-                        'SOCI': soci,
-                        'NOTE': ""  # Placeholder per eventuali note
-                    })
-                except Exception as row_e:
-                    print(f"Errore nel processing della riga per l'operatore {operatore}: {str(row_e)}")
-                    continue
-        
-        # Crea il dataframe dai dati raccolti
-        if rows:
-            processed_data = pd.DataFrame(rows)
+        # Estrazione vettoriale delle colonne posizionali: una operazione per
+        # colonna invece del doppio ciclo Python (operatori x iterrows) con
+        # una chiamata a to_float per ogni cella
+        n_cols = len(df.columns)
+
+        def _col(i, default=""):
+            """Colonna posizionale, o una colonna costante se il file è corto"""
+            return df.iloc[:, i] if i < n_cols else pd.Series(default, index=df.index)
+
+        def _num(i):
+            """Colonna posizionale convertita in float (0.0 se assente)"""
+            if i >= n_cols:
+                return pd.Series(0.0, index=df.index)
+            return to_float_array(df.iloc[:, i])
+
+        if len(df) > 0 and n_cols > 3:
+            # Blocco numerico L..P estratto in un'unica matrice float64
+            # contigua: le somme diventano operazioni NumPy su memoria
+            # lineare invece di addizioni fra Series con allineamento indice
+            numeric = np.column_stack([_num(i).to_numpy() for i in range(11, 16)])
+            dipendenti = numeric[:, 0] + numeric[:, 1]  # L+M = Dipendenti + Stage/Interinali
+            parasub = numeric[:, 2]                     # Colonna N
+            soci = numeric[:, 3]                        # Colonna O = SOCI
+            altro = numeric[:, 4]                       # Colonna P = ALTRO
+
+            processed_data = pd.DataFrame({
+                'Operatore': op_series,
+                'Codice': _col(2),   # Colonna C
+                'Azienda': _col(3),  # Colonna D
+                'DIP.': dipendenti,
+                'PARAS.': parasub,
+                'ALTRO': altro,
+                # Calcola il totale come somma di dipendenti, parasub e altro (escludendo soci)
+                'TOT.': dipendenti + parasub + altro,
+                'SOCI': soci,
+                'NOTE': ""  # Placeholder per eventuali note
+            }, copy=False)  # dict di array già pronti: adottali senza ricopiarli
         else:
             # Se non siamo riusciti a estrarre dati dalle colonne esatte, proviamo un'alternativa
             # Mappatura delle colonne per nome
+            # .lower() calcolato una volta sola per colonna, poi ogni ricerca
+            # scandisce il dict già normalizzato
+            lower_cols = {str(col).lower(): col for col in df.columns}
+
+            def _find_col(*needles):
+                return next((orig for low, orig in lower_cols.items()
+                             if any(n in low for n in needles)), None)
+
             col_map = {
-                'Operatore': next((col for col in df.columns if 'operatore' in col.lower() or 'descrizione oper' in col.lower()), None),
-                'Codice': next((col for col in df.columns if 'codice' in col.lower()), None),
-                'Azienda': next((col for col in df.columns if 'ragione sociale' in col.lower() or 'azienda' in col.lower()), None),
-                'DIP.': next((col for col in df.columns if 'dipendenti' in col.lower()), None),
-                'PARAS.': next((col for col in df.columns if 'parasub' in col.lower()), None),
-                'ALTRO': next((col for col in df.columns if 'altro' in col.lower()), None),
-                'TOT.': next((col for col in df.columns if 'totale' in col.lower()), None),
-                'SOCI': next((col for col in df.columns if 'soci' in col.lower()), None)
+                'Operatore': _find_col('operatore', 'descrizione oper'),
+                'Codice': _find_col('codice'),
+                'Azienda': _find_col('ragione sociale', 'azienda'),
+                'DIP.': _find_col('dipendenti'),
+                'PARAS.': _find_col('parasub'),
+                'ALTRO': _find_col('altro'),
+                'TOT.': _find_col('totale'),
+                'SOCI': _find_col('soci')
             }
             
             # Usa le colonne trovate per creare il dataframe
@@ -148,10 +150,17 @@ def process_data(payroll_data, manual_date_info=None):
             if 'TOT.' in processed_data.columns and all(processed_data['TOT.'] == 0):
                 processed_data['TOT.'] = processed_data['DIP.'] + processed_data['PARAS.'] + processed_data['ALTRO']
         
+        # Operatore è a bassa cardinalità ma ripetuto su molte righe: come
+        # category groupby e merge lavorano su codici interi invece che su
+        # stringhe Python, e la colonna scende a 1-2 byte per riga
+        if 'Operatore' in processed_data.columns:
+            processed_data['Operatore'] = processed_data['Operatore'].astype('category')
+
         # Assicurati che tutte le colonne numeriche siano effettivamente numeri
+        # (conversione vettoriale: niente chiamata Python per riga)
         for col in ['DIP.', 'PARAS.', 'ALTRO', 'TOT.', 'SOCI']:
             if col in processed_data.columns:
-                processed_data[col] = processed_data[col].apply(to_float)
+                processed_data[col] = to_float_array(processed_data[col])
         
         # Applica la logica corretta per le date secondo quanto richiesto:
         # - Match tra colonna C (Codice) del file "incolla qui" e colonna A (COD. AZIENDA) del file "lista aziende"
@@ -166,175 +175,109 @@ def process_data(payroll_data, manual_date_info=None):
         data_elab_col = df.columns.get_loc("Consegna") if "Consegna" in df.columns else None
         
         if data_elab_col is None:
-            print("Colonna 'Consegna' non trovata nel file")
+            logger.warning("Colonna 'Consegna' non trovata nel file")
         
-        # Crea un dizionario per mappare il codice azienda alla data di elaborazione
-        # Formato: {codice_azienda: {'giorno': giorno, 'stringa_data': data_formattata}}
+        # Crea un dizionario per mappare il codice azienda alla data formattata.
+        # Pipeline vettoriale: una manciata di operazioni su colonne intere al
+        # posto del ciclo iterrows con i suoi try/except e print per riga
         azienda_to_date_mapping = {}
-        
-        # Estrai la data dalla colonna "Consegna"
-        for idx, row in df.iterrows():
-            try:
-                cod_azienda = str(row['Codice']).strip()
-                if not cod_azienda:
-                    continue
-                    
-                # Ottieni la data dalla colonna "Consegna"
-                data_val = row.get('Consegna', None)
-                
-                # Stampa per debug
-                print(f"Riga {idx}: Codice azienda: '{cod_azienda}', Data val: '{data_val}'")
-                
-                # Se la data è vuota, 0 o non valida, usa 01/01/1900
-                if pd.isnull(data_val) or str(data_val).strip() == "" or str(data_val).strip() == "0":
-                    azienda_to_date_mapping[cod_azienda] = {
-                        'giorno': 1,
-                        'data': datetime(1900, 1, 1),
-                        'data_formattata': "01/01/1900"
-                    }
-                    print(f"  - Data mancante o zero per {cod_azienda}, usando 01/01/1900")
-                    continue
-                
-                if pd.notnull(data_val):
-                    # Prova diverse strategie per estrarre il giorno
-                    giorno = None
-                    
-                    # Strategia 1: è già un numero intero
-                    try:
-                        giorno_val = int(float(str(data_val).strip()))
-                        if 1 <= giorno_val <= 31:
-                            giorno = giorno_val
-                            print(f"  - Estratto giorno da numero: {giorno}")
-                    except:
-                        pass
-                    
-                    # Strategia 2: è una data in formato stringa
-                    if giorno is None:
-                        try:
-                            # Tenta di convertire in data
-                            data_str = str(data_val).strip()
-                            # Verifica se è in formato gg/mm/aaaa o simili
-                            if '/' in data_str:
-                                parts = data_str.split('/')
-                                if len(parts) >= 1 and parts[0].isdigit():
-                                    giorno = int(parts[0])
-                                    print(f"  - Estratto giorno da stringa con /: {giorno}")
-                            # Verifica se è in formato gg-mm-aaaa o simili
-                            elif '-' in data_str:
-                                parts = data_str.split('-')
-                                if len(parts) >= 1 and parts[0].isdigit():
-                                    giorno = int(parts[0])
-                                    print(f"  - Estratto giorno da stringa con -: {giorno}")
-                        except:
-                            pass
-                    
-                    # Strategia 3: è una data in formato datetime
-                    if giorno is None:
-                        try:
-                            data_datetime = pd.to_datetime(data_val, errors='coerce')
-                            if pd.notnull(data_datetime):
-                                giorno = data_datetime.day
-                                print(f"  - Estratto giorno da datetime: {giorno}")
-                        except:
-                            pass
-                            
-                    # Se non siamo riusciti a estrarre un giorno valido, usa un valore di default
-                    if giorno is None:
-                        # Usa il primo giorno del mese come fallback
-                        giorno = 1
-                        print(f"  - Usando giorno di default: {giorno}")
-                        
-                    # Calcola mese e anno secondo la regola
-                    # Se giorno > 15, usa il mese selezionato
-                    # Se giorno <= 15, usa il mese successivo
-                    mese_da_usare = selected_month if giorno > 15 else (selected_month % 12) + 1
-                    
-                    # Gestisci il cambio di anno se necessario
-                    anno_da_usare = selected_year
-                    if mese_da_usare < selected_month:
-                        anno_da_usare += 1
-                    
-                    # Assicurati che il giorno sia valido per il mese selezionato
-                    try:
-                        # Calcola l'ultimo giorno del mese
-                        if mese_da_usare in [4, 6, 9, 11]:  # Aprile, Giugno, Settembre, Novembre
-                            ultimo_giorno = 30
-                        elif mese_da_usare == 2:  # Febbraio
-                            # Controllo anno bisestile
-                            if (anno_da_usare % 4 == 0 and anno_da_usare % 100 != 0) or (anno_da_usare % 400 == 0):
-                                ultimo_giorno = 29
-                            else:
-                                ultimo_giorno = 28
-                        else:
-                            ultimo_giorno = 31
-                        
-                        # Usa il giorno corretto (non superiore all'ultimo giorno del mese)
-                        giorno_corretto = min(giorno, ultimo_giorno)
-                        
-                        # Crea la data completa come datetime per elaborazioni interne
-                        data_elaborazione = datetime(anno_da_usare, mese_da_usare, giorno_corretto)
-                        
-                        # Crea anche la stringa della data formattata
-                        data_formattata = f"{giorno_corretto:02d}/{mese_da_usare:02d}/{anno_da_usare}"
-                        
-                        # Aggiungi al mapping sia il giorno originale che la data formattata
-                        azienda_to_date_mapping[cod_azienda] = {
-                            'giorno': giorno, 
-                            'data': data_elaborazione,
-                            'data_formattata': data_formattata
-                        }
-                        
-                        print(f"  - Data finale per {cod_azienda}: {data_formattata}")
-                    except ValueError as e:
-                        # Se la data non è valida, stampa l'errore e salta
-                        print(f"  - Errore nella creazione della data: {str(e)}")
-                        continue
-            except Exception as e:
-                print(f"  - Errore nell'elaborazione della data: {str(e)}")
-                continue
 
-        # Stampa il mapping per debug
-        print(f"Mapping codice azienda -> data: {azienda_to_date_mapping}")
-        
-        # Assegna le date alle righe in base al codice azienda
-        processed_data['Data'] = None
-        
-        # Per ogni riga nel dataframe elaborato
-        for idx, row in processed_data.iterrows():
-            codice_azienda = str(row['Codice']).strip()
-            
-            # Cerca la data dal mapping
-            if codice_azienda in azienda_to_date_mapping:
-                # Usa la data formattata correttamente
-                processed_data.at[idx, 'Data'] = azienda_to_date_mapping[codice_azienda]['data_formattata']
+        if "Codice" in df.columns:
+            codici = df['Codice'].astype(str).str.strip()
+            if data_elab_col is not None:
+                consegna = df['Consegna'].astype(str).str.strip()
             else:
-                # Data di fallback solo se l'azienda non è presente nel mapping
-                processed_data.at[idx, 'Data'] = "01/01/1900"
-                print(f"  - Azienda {codice_azienda} non trovata nel mapping, usando 01/01/1900")
+                consegna = pd.Series("", index=df.index)
+
+            # Data vuota, 0 o non valida -> 01/01/1900
+            vuote = df['Consegna'].isna() if data_elab_col is not None else pd.Series(True, index=df.index)
+            vuote = vuote | (consegna == "") | (consegna == "0")
+
+            # Strategia 1: il valore è già un numero di giorno (1-31)
+            giorno_num = pd.to_numeric(consegna, errors='coerce')
+            giorno = giorno_num.where(giorno_num.between(1, 31))
+
+            # Strategia 2: stringa che inizia con il giorno ("gg/mm/..." o
+            # "gg-mm-..."): estrazione regex con coerce, nessuna eccezione.
+            # Limita a 1-31 come la strategia 1: un giorno 0 manderebbe in
+            # errore l'assemblaggio datetime a valle
+            estratto = pd.to_numeric(
+                consegna.str.extract(r'^(\d{1,2})[/-]', expand=False), errors='coerce')
+            giorno = giorno.fillna(estratto.where(estratto.between(1, 31)))
+
+            # Strategia 3: è una data completa, prendi il giorno. format='mixed'
+            # analizza ogni valore per conto suo come il vecchio pd.to_datetime
+            # per riga: la colonna può mescolare formati diversi (celle data
+            # più celle testo) e senza mixed l'intera serie erediterebbe il
+            # formato del primo valore, coercendo gli altri a NaT
+            dt = pd.to_datetime(consegna.where(giorno.isna()),
+                                format='mixed', errors='coerce')
+            giorno = giorno.fillna(dt.dt.day)
+
+            # Fallback: primo giorno del mese
+            giorno = giorno.fillna(1).astype(int).to_numpy()
+
+            # Regola: se giorno > 15 usa il mese selezionato, altrimenti il
+            # mese successivo (con eventuale cambio di anno)
+            mese = np.where(giorno > 15, selected_month, (selected_month % 12) + 1)
+            anno = np.where(mese < selected_month, selected_year + 1, selected_year)
+
+            # Ultimo giorno del mese: load indicizzato sulla tabella più la
+            # correzione bisestile per febbraio, senza cascata di confronti
+            bisestile = ((anno % 4 == 0) & (anno % 100 != 0)) | (anno % 400 == 0)
+            ultimo = np.where((mese == 2) & bisestile, 29, MONTH_DAYS[mese - 1])
+
+            # Usa il giorno corretto (non superiore all'ultimo giorno del mese)
+            giorno_corretto = np.minimum(giorno, ultimo)
+
+            # Tieni la data come datetime64 (8 byte, ordinabile) invece di
+            # costruire subito la stringa: la formattazione avviene solo alla
+            # generazione del PDF
+            data_elaborazione = pd.to_datetime(
+                pd.DataFrame({'year': anno, 'month': mese, 'day': giorno_corretto}))
+            data_elaborazione.index = df.index
+            data_elaborazione = data_elaborazione.mask(vuote, pd.Timestamp(1900, 1, 1))
+
+            valid = codici != ""
+            azienda_to_date_mapping = dict(zip(codici[valid], data_elaborazione[valid]))
+
+        # Logga il mapping per debug: la formattazione del dizionario (che può
+        # essere enorme) viene materializzata solo se DEBUG è attivo
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Mapping codice azienda -> data: %s", azienda_to_date_mapping)
+        
+        # Assegna le date alle righe in base al codice azienda: un unico map
+        # vettoriale al posto del ciclo riga per riga con le scritture .at
+        # (fallback 01/01/1900 per le aziende non presenti nel mapping).
+        # La colonna resta datetime64: la stringa gg/mm/aaaa viene prodotta
+        # solo dal generatore PDF
+        processed_data['Data'] = pd.to_datetime(
+            processed_data['Codice'].astype(str).str.strip()
+            .map(azienda_to_date_mapping))
+        processed_data['Data'] = processed_data['Data'].fillna(pd.Timestamp(1900, 1, 1))
         
         # Aggiungi altre colonne richieste per compatibilità con il generatore PDF
         processed_data['Importo'] = processed_data['TOT.']
         processed_data['Descrizione'] = processed_data['Azienda']
         
-        # Format numeric columns
-        for col in ['TOT.', 'Importo']:
-            if col in processed_data.columns:
-                processed_data[f'{col}_Formatted'] = processed_data[col].apply(format_currency)
-        
-        # Calculate totals by employee
-        employee_totals = processed_data.groupby('Operatore')['Importo'].sum().reset_index()
-        employee_totals.rename(columns={'Importo': 'TotaleImporto'}, inplace=True)
+        # Format numeric columns. Importo è una copia di TOT., quindi la
+        # formattazione si calcola una volta sola e si riusa
+        processed_data['TOT._Formatted'] = format_currency_array(processed_data['TOT.'])
+        processed_data['Importo_Formatted'] = processed_data['TOT._Formatted']
         
-        # Merge totals back to the main dataframe
-        processed_data = processed_data.merge(employee_totals, on='Operatore')
+        # Calculate totals by employee: transform('sum') fa broadcast del
+        # totale per riga in un solo passaggio, senza hash-join né frame
+        # intermedio come il vecchio groupby().sum() + merge
+        processed_data['TotaleImporto'] = (
+            processed_data.groupby('Operatore', observed=True)['Importo'].transform('sum'))
         
-        # Add empty CompanyDetails column for compatibility with older code
+        # Add empty CompanyDetails column for compatibility with older code.
+        # Assegnazione a colonna intera: come per tutte le colonne qui sopra,
+        # mai scritture scalari .at/.iloc riga per riga
         processed_data['CompanyDetails'] = [{}] * len(processed_data)
         
         return processed_data, date_info
         
     except Exception as e:
-        print(f"Error processing data: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("Error processing data: %s", str(e))
         raise e
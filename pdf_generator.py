@@ -4,30 +4,49 @@ from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph,
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import cm, mm
 import pandas as pd
+import numpy as np
 from utils import format_currency
 import locale
 from datetime import datetime
 import re
 
-def generate_pdf(employee_data, output_path, date_info):
+def generate_pdf(employee_data, output, date_info):
     """
     Generate a PDF payslip for an employee.
-    
+
     Args:
         employee_data (pd.DataFrame): DataFrame containing the employee's data
-        output_path (str): Path where to save the PDF
+        output (str or file-like): Path or binary stream where to write the PDF
         date_info (dict): Dictionary with date information for the header
     """
     if employee_data.empty:
         return False
-    
+
+    # Delega al percorso veloce su array NumPy: niente overhead pandas
+    # (lookup di label, boxing dei dtype) nell'iterazione per riga
+    cols = {c: employee_data[c].to_numpy() for c in employee_data.columns}
+    return generate_pdf_fast(cols, output, date_info)
+
+
+def generate_pdf_fast(cols, output, date_info):
+    """
+    Generate a PDF payslip from a dict of column -> numpy array.
+
+    Args:
+        cols (dict): Mapping column name -> np.ndarray with the employee's data
+        output (str or file-like): Path or binary stream where to write the PDF
+        date_info (dict): Dictionary with date information for the header
+    """
+    if len(cols.get('Operatore', ())) == 0:
+        return False
+
     # Get employee name and total amount
-    employee_name = str(employee_data['Operatore'].iloc[0])
-    total_amount = employee_data['TotaleImporto'].iloc[0]
-    
+    employee_name = str(cols['Operatore'][0])
+    total_amount = cols['TotaleImporto'][0]
+
     # Create PDF document
     doc = SimpleDocTemplate(
-        output_path,
+        output,
         pagesize=A4,
         rightMargin=1.5*cm,
         leftMargin=1.5*cm,
@@ -39,7 +58,8 @@ def generate_pdf(employee_data, output_path, date_info):
     elements = []
     
     # Conta il numero totale di date (una tabella per data)
-    total_pages = len(pd.unique(employee_data['Data']))
+    data_col = cols['Data']
+    total_pages = len(set(data_col.tolist()))
     
     # Modern Apple-style colors
     apple_blue = colors.HexColor('#007AFF')
@@ -93,8 +113,13 @@ def generate_pdf(employee_data, output_path, date_info):
     elements.append(Paragraph(f"Elenco mese di {date_info['period']} - {employee_name}", title_style))
     elements.append(Spacer(1, 0.3*cm))  # Ridotto spazio dopo il titolo
     
-    # Ottieni le date uniche e ordinale dalla più vecchia alla più recente
-    unique_dates = sorted(employee_data['Data'].unique(), key=convert_date_string)
+    # Ottieni le date uniche e ordinale dalla più vecchia alla più recente.
+    # Le colonne datetime64 restano array NumPy (tolist() le degraderebbe a
+    # interi epoch); le stringhe legacy passano dalla chiave YYYYMMDD
+    if np.issubdtype(data_col.dtype, np.datetime64):
+        unique_dates = np.unique(data_col)
+    else:
+        unique_dates = sorted(set(data_col.tolist()), key=convert_date_string)
     
     # Stima di quanto spazio rimane nella pagina corrente
     available_space = 0  # Inizialmente 0, sarà aggiornato dopo ogni tabella
@@ -112,12 +137,18 @@ def generate_pdf(employee_data, output_path, date_info):
     
     # Per ogni data, crea una sezione separata
     for i, date in enumerate(unique_dates):
-        # Formato data più leggibile
-        date_str = date if isinstance(date, str) else str(date)
+        # Formato data più leggibile (la colonna datetime viene formattata
+        # solo qui, una volta per data unica)
+        if isinstance(date, np.datetime64):
+            date_str = pd.Timestamp(date).strftime('%d/%m/%Y')
+        elif hasattr(date, 'strftime'):
+            date_str = date.strftime('%d/%m/%Y')
+        else:
+            date_str = date if isinstance(date, str) else str(date)
         
         # Calcola lo spazio necessario per questa tabella
-        date_data = employee_data[employee_data['Data'] == date]
-        rows_count = len(date_data) + 1  # +1 per l'header
+        date_idx = np.flatnonzero(data_col == date)
+        rows_count = len(date_idx) + 1  # +1 per l'header
         estimated_table_height = (rows_count * 12) * mm  # Stima rozza: 12mm per riga
         
         # Calcola lo spazio necessario includendo tutti gli elementi
@@ -155,17 +186,20 @@ def generate_pdf(employee_data, output_path, date_info):
         headers = ['COD.', 'DATORE DI LAVORO', 'DIP.', 'PARAS.', 'ALTRO', 'TOT.', 'SOCI', 'NOTE']
         table_data.append(headers)
         
-        # Aggiungi righe
-        for _, row in date_data.iterrows():
+        # Aggiungi righe: accesso diretto agli ndarray, niente .iloc per riga
+        for j in date_idx:
+            dip = cols['DIP.'][j]
+            paras = cols['PARAS.'][j]
+            altro = cols['ALTRO'][j]
             table_row = [
-                str(row.get('Codice', '')),
-                str(row.get('Azienda', ''))[:40],  # Tronca i nomi troppo lunghi a 40 caratteri
-                str(int(row.get('DIP.', 0))),      # Converti a intero
-                str(int(row.get('PARAS.', 0))),    # Converti a intero
-                str(int(row.get('ALTRO', 0))),     # Converti a intero
-                str(int(row.get('DIP.', 0) + row.get('PARAS.', 0) + row.get('ALTRO', 0))),  # Calcola TOT
-                str(int(row.get('SOCI', 0))),      # Converti a intero
-                str(row.get('NOTE', ''))
+                str(cols['Codice'][j]),
+                str(cols['Azienda'][j])[:40],  # Tronca i nomi troppo lunghi a 40 caratteri
+                str(int(dip)),                 # Converti a intero
+                str(int(paras)),               # Converti a intero
+                str(int(altro)),               # Converti a intero
+                str(int(dip + paras + altro)), # Calcola TOT
+                str(int(cols['SOCI'][j])),     # Converti a intero
+                str(cols['NOTE'][j])
             ]
             table_data.append(table_row)
         